@@ -28,10 +28,12 @@ from __future__ import annotations
 
 import os
 import json
+import shutil
 import threading
-import zipfile
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional, Set
 
+from cachetools import TTLCache
 from flask import (
     Flask,
     render_template,
@@ -42,7 +44,13 @@ from flask import (
     jsonify,
 )
 
-from utils import download_all
+from utils import PART_SUFFIX, download_all
+
+try:
+    # Considerably faster than the standard library for history I/O.
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
 
 app = Flask(
     __name__, template_folder=os.path.join(os.path.dirname(__file__), 'templates')
@@ -57,96 +65,261 @@ os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 # ``model`` and ``zip``.  Each entry corresponds to a completed download.
 HISTORY_FILE = os.path.join(DOWNLOAD_DIR, 'history.json')
 
-# Global dictionary used to track download progress.  Keys are model names
-# and values are dictionaries with keys: ``current``, ``total``, ``status``
-# and ``zip_path``.
-progress_data: Dict[str, Dict[str, Any]] = {}
+# Global cache used to track download progress.  Keys are model names and
+# values are dictionaries with keys: ``current``, ``total``, ``status``,
+# ``zip_path`` and ``cv``.  ``cv`` is a :class:`threading.Condition` that
+# guards the other values of its entry and is notified whenever they change,
+# allowing clients to long-poll.  Entries expire after a day so the cache
+# does not grow without bound; ``_progress_lock`` only guards the cache
+# itself, never an individual entry.
+progress_data: TTLCache = TTLCache(maxsize=2048, ttl=24 * 3600)
+_progress_lock = threading.Lock()
+
+# Longest time in seconds a progress request waits for a change before
+# returning the unchanged snapshot.
+PROGRESS_POLL_TIMEOUT = 25
+
+# Names of the models whose download is currently running.  Duplicate
+# requests are coalesced onto the running task rather than starting a second
+# one for the same archive.
+_inflight: Set[str] = set()
+_inflight_lock = threading.Lock()
+
+# In-memory copy of the history file.  ``mtime`` (in nanoseconds) and
+# ``size`` record the file state the cached ``data`` was loaded from; the
+# file is parsed again only when either changes.  ``models`` indexes the
+# model names present in ``data`` for constant-time duplicate checks.
+_history_cache: Dict[str, Any] = {'mtime': 0, 'size': -1, 'data': [], 'models': set()}
+_history_lock = threading.Lock()
+
+
+def _json_loads(raw: bytes) -> Any:
+    """Parse JSON from ``raw`` bytes, using :mod:`orjson` when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(value: Any) -> bytes:
+    """Serialise ``value`` to compact JSON bytes, using :mod:`orjson` when available."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _load_history() -> List[Dict[str, str]]:
+    """Return the cached history, reloading it if the file changed on disk.
+
+    Must be called with ``_history_lock`` held.
+    """
+    try:
+        st = os.stat(HISTORY_FILE)
+    except OSError:
+        _history_cache.update(mtime=0, size=-1, data=[], models=set())
+        return _history_cache['data']
+    if st.st_mtime_ns != _history_cache['mtime'] or st.st_size != _history_cache['size']:
+        try:
+            with open(HISTORY_FILE, 'rb') as f:
+                data = _json_loads(f.read())
+        except Exception:
+            data = []
+        _history_cache.update(
+            mtime=st.st_mtime_ns,
+            size=st.st_size,
+            data=data,
+            models={entry['model'] for entry in data},
+        )
+    return _history_cache['data']
+
+
+def _store_history(history: List[Dict[str, str]], models: Optional[Set[str]] = None) -> None:
+    """Write ``history`` to disk and refresh the cache.
+
+    ``models`` is the set of model names in ``history``; it is rebuilt from
+    the entries when not supplied.  Must be called with ``_history_lock``
+    held.
+    """
+    # Write to a temporary file first and swap it in, so that a crash
+    # mid-write never leaves a truncated history behind.
+    tmp_path = HISTORY_FILE + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(_json_dumps(history))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, HISTORY_FILE)
+        st = os.stat(HISTORY_FILE)
+    except Exception:
+        # Silently ignore errors writing history
+        return
+    if models is None:
+        models = {entry['model'] for entry in history}
+    _history_cache.update(mtime=st.st_mtime_ns, size=st.st_size, data=history, models=models)
 
 
 def read_history() -> List[Dict[str, str]]:
     """Return the download history as a list of entries.
 
     Each entry has the form ``{"model": <model_name>, "zip": <zip_filename>}``.
-    If the history file does not exist an empty list is returned.
+    If the history file does not exist an empty list is returned.  The file
+    is only parsed again when its modification time or size has changed;
+    callers receive a copy they are free to modify.
     """
-    if not os.path.exists(HISTORY_FILE):
-        return []
-    try:
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    with _history_lock:
+        return list(_load_history())
 
 
 def write_history(history: List[Dict[str, str]]) -> None:
     """Persist the download history to disk."""
-    try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2)
-    except Exception:
-        # Silently ignore errors writing history
-        pass
+    with _history_lock:
+        _store_history(list(history))
 
 
 def add_history_entry(model_name: str, zip_filename: str) -> None:
     """Add a new entry to the history file."""
-    history = read_history()
-    history.append({'model': model_name, 'zip': zip_filename})
-    write_history(history)
+    with _history_lock:
+        history = _load_history()
+        _store_history(
+            history + [{'model': model_name, 'zip': zip_filename}],
+            _history_cache['models'] | {model_name},
+        )
+
+
+def remove_history_entries(models: Iterable[str]) -> None:
+    """Remove every entry for the given model names from the history file."""
+    removed = set(models)
+    with _history_lock:
+        history = _load_history()
+        _store_history(
+            [entry for entry in history if entry['model'] not in removed],
+            _history_cache['models'] - removed,
+        )
+
+
+def in_history(model_name: str) -> bool:
+    """Return ``True`` if ``model_name`` has been downloaded before."""
+    with _history_lock:
+        _load_history()
+        return model_name in _history_cache['models']
+
+
+def get_progress(model_name: str) -> Optional[Dict[str, Any]]:
+    """Return the progress entry for ``model_name`` or ``None`` if unknown.
+
+    Read the values of the returned entry while holding its ``cv``.
+    """
+    with _progress_lock:
+        return progress_data.get(model_name)
 
 
 def start_download_task(url: str, model_name: str, target_dir: str, workers: int) -> None:
-    """Spawn a background thread to download all media and build a zip archive.
+    """Spawn a background thread that downloads all media into a zip archive.
 
     The progress of the download is recorded in the global ``progress_data``.
-    When the download completes the ZIP archive is stored and a history
-    entry is written.
+    Media files are streamed straight into the archive; when the download
+    completes the archive is finalised and a history entry is written.  If
+    a download of the same model is already running no new task is started;
+    the caller shares the progress of the running one instead.
 
     Args:
         url: The Fapello page URL ending with a slash.
         model_name: The username derived from the URL.
-        target_dir: Directory where media files will be stored.
+        target_dir: Directory where earlier versions stored media files.  Any
+            files found there are added to the archive instead of being
+            downloaded again.
         workers: Maximum number of concurrent download workers.
     """
-    # Initialise progress tracking
-    progress_data[model_name] = {
+    with _inflight_lock:
+        if model_name in _inflight:
+            return
+        _inflight.add(model_name)
+
+    # Initialise progress tracking.  The worker keeps its own reference to the
+    # entry so that updates never need the global lock.
+    data: Dict[str, Any] = {
         'current': 0,
         'total': 0,
         'status': 'downloading',
         'zip_path': '',
+        'cv': threading.Condition(),
     }
+    with _progress_lock:
+        progress_data[model_name] = data
 
     def progress_cb(model: str, current: int, total: int) -> None:
         # Update the progress data for the given model.  Assign the total only
         # when it is nonzero; this allows the front end to display a
         # placeholder until the count is known.
-        progress_data[model]['current'] = current
-        progress_data[model]['total'] = total
+        with data['cv']:
+            data['current'] = current
+            data['total'] = total
+            data['cv'].notify_all()
 
     # Perform downloads and zipping in a worker thread
     def worker() -> None:
-        # Download all media files and capture the total count
-        total = download_all(url, target_dir, max_workers=workers, progress_cb=progress_cb)
-        # Ensure the final values are set even if no progress callback was invoked
-        progress_data[model_name]['total'] = total
-        # Build ZIP archive
-        zip_name = f"{model_name}.zip"
-        zip_path = os.path.join(DOWNLOAD_DIR, zip_name)
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, _, files in os.walk(target_dir):
-                for filename in files:
-                    abs_path = os.path.join(root, filename)
-                    # Use only the filename inside the archive to avoid nested paths
-                    zf.write(abs_path, arcname=filename)
-        # Update progress data to reflect completion
-        progress_data[model_name]['status'] = 'done'
-        progress_data[model_name]['zip_path'] = zip_path
-        # Record history entry
-        add_history_entry(model_name, zip_name)
+        try:
+            zip_name = f"{model_name}.zip"
+            zip_path = os.path.join(DOWNLOAD_DIR, zip_name)
+            # Download all media files into the archive and capture the total count
+            total = download_all(
+                url,
+                zip_path,
+                max_workers=workers,
+                progress_cb=progress_cb,
+                legacy_dir=target_dir,
+            )
+            with data['cv']:
+                # Ensure the final values are set even if no progress callback was invoked
+                data['total'] = total
+                # Update progress data to reflect completion
+                data['status'] = 'done'
+                data['zip_path'] = zip_path
+                data['cv'].notify_all()
+            # Record history entry
+            add_history_entry(model_name, zip_name)
+        except Exception:
+            # Report the failure so the progress page stops waiting
+            with data['cv']:
+                data['status'] = 'error'
+                data['cv'].notify_all()
+        finally:
+            # Allow new downloads of this model again
+            with _inflight_lock:
+                _inflight.discard(model_name)
 
     threading.Thread(target=worker, daemon=True).start()
 
 
+def _remove_model_file(model: str) -> None:
+    """Delete the media directory and ZIP archive of ``model``, if present.
+
+    A partial archive left behind by an interrupted download is removed too.
+    Models whose download is still running are left alone, as their archive
+    is being written at that moment.
+    """
+    with _inflight_lock:
+        if model in _inflight:
+            return
+    dir_path = os.path.join(DOWNLOAD_DIR, model)
+    zip_path = os.path.join(DOWNLOAD_DIR, f"{model}.zip")
+    try:
+        if os.path.isdir(dir_path):
+            shutil.rmtree(dir_path, ignore_errors=True)
+        for path in (zip_path, zip_path + PART_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+    except Exception:
+        pass
+
+
+def _remove_model_files(models: List[str]) -> None:
+    """Delete the files of several models concurrently."""
+    if not models:
+        return
+    with ThreadPoolExecutor(max_workers=min(16, len(models))) as executor:
+        list(executor.map(_remove_model_file, models))
+
+
 @app.route('/', methods=['GET'])
 def index() -> str:
     """Render the home page with optional message feedback."""
@@ -184,8 +357,7 @@ def download_route() -> Any:
         workers = 15
     workers = max(1, min(60, workers))
     # If the model already exists in history and user has not confirmed, prompt for confirmation
-    history = read_history()
-    if any(entry['model'] == model_name for entry in history) and not confirm_flag:
+    if not confirm_flag and in_history(model_name):
         # Render a confirmation page with hidden form fields to carry the user inputs
         return render_template(
             'confirm.html',
@@ -206,25 +378,41 @@ def progress_page(model: str) -> str:
 
 @app.route('/progress_data/<model>', methods=['GET'])
 def progress_json(model: str) -> Any:
-    """Return JSON with current progress for the specified model."""
-    data = progress_data.get(model)
+    """Return JSON with current progress for the specified model.
+
+    If the ``since`` query parameter holds the ``current`` value the client
+    last saw, the response is held back until progress moves past it, the
+    download finishes or ``PROGRESS_POLL_TIMEOUT`` seconds elapse.
+    """
+    data = get_progress(model)
     if not data:
         # If no progress data exists return a default placeholder
         return jsonify({'current': 0, 'total': 0, 'status': 'unknown'})
-    return jsonify({
-        'current': data.get('current', 0),
-        'total': data.get('total', 0),
-        'status': data.get('status', ''),
-    })
+    since = request.args.get('since', type=int)
+    with data['cv']:
+        if since is not None:
+            data['cv'].wait_for(
+                lambda: data['current'] != since or data['status'] != 'downloading',
+                timeout=PROGRESS_POLL_TIMEOUT,
+            )
+        snapshot = {
+            'current': data.get('current', 0),
+            'total': data.get('total', 0),
+            'status': data.get('status', ''),
+        }
+    return jsonify(snapshot)
 
 
 @app.route('/download-file/<model>', methods=['GET'])
 def download_file(model: str) -> Any:
     """Return the completed ZIP archive for the given model, if available."""
-    data = progress_data.get(model)
-    if not data or data.get('status') != 'done':
+    data = get_progress(model)
+    if not data:
+        return 'File not ready', 404
+    with data['cv']:
+        status, zip_path = data.get('status'), data.get('zip_path')
+    if status != 'done':
         return 'File not ready', 404
-    zip_path = data.get('zip_path')
     if not zip_path or not os.path.exists(zip_path):
         return 'File not found', 404
     return send_file(zip_path, as_attachment=True, download_name=os.path.basename(zip_path))
@@ -239,39 +427,14 @@ def history_page() -> Any:
         # Determine which entries have been selected for deletion (if any)
         selected = request.form.getlist('selected')  # list of model names
         if action == 'delete_selected':
-            # Delete selected entries
-            for model in selected:
-                # Remove files and directories
-                dir_path = os.path.join(DOWNLOAD_DIR, model)
-                zip_file = f"{model}.zip"
-                zip_path = os.path.join(DOWNLOAD_DIR, zip_file)
-                try:
-                    if os.path.isdir(dir_path):
-                        import shutil
-                        shutil.rmtree(dir_path, ignore_errors=True)
-                    if os.path.exists(zip_path):
-                        os.remove(zip_path)
-                except Exception:
-                    pass
+            # Delete selected entries and their files
+            _remove_model_files(selected)
             # Filter history
-            history = [entry for entry in history if entry['model'] not in selected]
-            write_history(history)
+            remove_history_entries(selected)
         elif action == 'delete_all':
             # Delete all entries and all associated files
-            for entry in history:
-                model = entry['model']
-                dir_path = os.path.join(DOWNLOAD_DIR, model)
-                zip_path = os.path.join(DOWNLOAD_DIR, f"{model}.zip")
-                try:
-                    if os.path.isdir(dir_path):
-                        import shutil
-                        shutil.rmtree(dir_path, ignore_errors=True)
-                    if os.path.exists(zip_path):
-                        os.remove(zip_path)
-                except Exception:
-                    pass
-            history = []
-            write_history(history)
+            _remove_model_files([entry['model'] for entry in history])
+            write_history([])
         # Redirect back to GET after POST
         return redirect(url_for('history_page'))
     return render_template('history.html', history=history)
@@ -281,4 +444,5 @@ if __name__ == '__main__':
     # Run the development server when invoked directly.  In production the
     # Dockerfile will run ``flask run`` instead.
     port = int(os.environ.get('PORT', '8080'))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    # Threaded so that long-polling progress requests do not block others
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
\ No newline at end of file
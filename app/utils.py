@@ -7,21 +7,41 @@ original desktop implementation but have been simplified for use in a
 Flask server.
 
 The primary entry point is :func:`download_all`, which takes a Fapello
-page URL and downloads every media file into a target directory.  A
-progress callback can be supplied to receive updates after each file
-is saved.
+page URL and streams every media file into a ZIP archive.  A progress
+callback can be supplied to receive updates after each file is saved.
 """
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import itertools
 import os
 import re
+import shutil
+import sys
+import tempfile
 import threading
+import time
+import zipfile
+import zlib
 from concurrent.futures import ThreadPoolExecutor
-from typing import Tuple, Optional, List, Callable
+from typing import Tuple, Optional, List, Callable, BinaryIO, AsyncIterator
 
 import requests
-from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+# True when running on a free-threaded (no-GIL) interpreter such as 3.13t
+# with the GIL actually disabled.  Worker threads then run Python code in
+# parallel and may no longer rely on the GIL for atomicity.
+FREE_THREADED = not getattr(sys, '_is_gil_enabled', lambda: True)()
 
 # HTTP headers used when making requests to Fapello.  A desktop browser
 # User‑Agent string is used to avoid blocks that some websites place on
@@ -34,6 +54,68 @@ HEADERS_FOR_REQUESTS = {
     )
 }
 
+# Patterns matching the "123 Media" counter on a profile page, in the raw
+# markup and in the extracted text respectively.
+_MEDIA_COUNT_RE = re.compile(rb"(\d+)\s*Media")
+_MEDIA_COUNT_TEXT_RE = re.compile(r"(\d+)\s*Media")
+
+# Retry policy for failed requests: up to two retries on connection errors
+# and on the listed transient statuses, with exponential backoff.
+RETRY_TOTAL = 2
+RETRY_BACKOFF_FACTOR = 0.2
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Shared HTTP session so that connections to Fapello and its CDN are kept
+# alive and reused across requests and worker threads.  The pool is sized
+# to cover the maximum number of download workers (60).
+HTTP_POOL_SIZE = 64
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS_FOR_REQUESTS)
+_adapter = HTTPAdapter(
+    pool_connections=HTTP_POOL_SIZE,
+    pool_maxsize=HTTP_POOL_SIZE,
+    max_retries=Retry(
+        total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES
+    ),
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+# Timeouts for the asynchronous client, mirroring the ones used with
+# ``SESSION``: 30 seconds for HTML pages and 60 seconds between reads of
+# a media file.
+if aiohttp is not None:
+    PAGE_TIMEOUT = aiohttp.ClientTimeout(total=30)
+    MEDIA_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=60)
+
+# Media page scraped up front to learn the CDN URL layout, letting the
+# remaining files be requested directly without fetching their pages.
+TEMPLATE_SAMPLE_INDEX = 1
+
+# Minimum number of seconds between two progress reports that are not
+# otherwise due (see :func:`_progress_reporter`).
+PROGRESS_MIN_INTERVAL = 0.25
+
+# Default DEFLATE level for compressible ZIP entries.  Level 1 is several
+# times faster than the zlib default of 6 and typically compresses almost
+# as well.  Nearly everything archived is already-compressed media that
+# is stored, so a higher level would buy next to nothing.
+ZIP_COMPRESSLEVEL = 1
+
+# Extensions of media formats that are already compressed.  Running them
+# through DEFLATE again costs CPU for practically no size reduction, so
+# they are stored as-is in the ZIP archive.
+STORED_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.mp4', '.webm', '.mov'})
+
+# Suffix of the file an archive is built in until it is complete.
+PART_SUFFIX = '.part'
+
+# Downloads are buffered in memory up to this size before spilling to a
+# temporary file.  Response bodies are read, and buffered files copied into
+# the archive, in chunks of ``ARCHIVE_COPY_BUFSIZE`` bytes.
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+ARCHIVE_COPY_BUFSIZE = 1024 * 1024
+
 
 def get_fapello_files_number(url: str) -> int:
     """Return the number of media files available at the given Fapello URL.
@@ -50,23 +132,33 @@ def get_fapello_files_number(url: str) -> int:
         the page cannot be parsed.
     """
     try:
-        page = requests.get(url, headers=HEADERS_FOR_REQUESTS, timeout=30)
+        page = SESSION.get(url, timeout=30)
     except Exception:
         return 0
-    soup = BeautifulSoup(page.content, "lxml")
+    return _parse_files_number(page.content, url)
+
 
-    # Attempt to extract the count from text like "123 Media"
-    match = re.search(r"(\d+)\s*Media", soup.get_text())
+def _parse_files_number(content: bytes, url: str) -> int:
+    """Return the media count found in the HTML ``content`` of the page at ``url``."""
+    # Attempt to extract the count from text like "123 Media".  The raw
+    # markup usually contains it verbatim, which avoids parsing the page.
+    match = _MEDIA_COUNT_RE.search(content)
+    if match:
+        return int(match.group(1))
+    tree = HTMLParser(content)
+    match = _MEDIA_COUNT_TEXT_RE.search(tree.body.text() if tree.body else '')
     if match:
         return int(match.group(1))
 
     # Fallback: find all numbered links that lead to individual media pages
-    pattern = re.compile(f"{re.escape(url)}(\d+)/")
-    all_href_links = soup.find_all('a', href=pattern)
+    pattern = re.compile(f"{re.escape(url)}(\\d+)/")
+    all_href_links = [
+        link for link in tree.css('a[href]') if pattern.search(link.attributes.get('href') or '')
+    ]
 
     max_number = 0
     for link in all_href_links:
-        link_href = link.get('href').rstrip('/')
+        link_href = link.attributes['href'].rstrip('/')
         link_href_numeric = link_href.split('/')[-1]
         if link_href_numeric.isnumeric():
             max_number = max(max_number, int(link_href_numeric))
@@ -87,38 +179,40 @@ def get_fapello_file_url(link: str) -> Tuple[Optional[str], Optional[str]]:
         ``(None, None)`` is returned.
     """
     try:
-        page = requests.get(link, headers=HEADERS_FOR_REQUESTS, timeout=30)
+        page = SESSION.get(link, timeout=30)
     except Exception:
         return None, None
-    soup = BeautifulSoup(page.content, "lxml")
-    file_element = soup.find("div", class_="flex justify-between items-center")
+    return _parse_file_url(page.content)
+
+
+def _parse_file_url(content: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """Return ``(file_url, file_type)`` found in the HTML ``content`` of a media page."""
+    tree = HTMLParser(content)
+    file_element = tree.css_first("div.flex.justify-between.items-center")
     if not file_element:
         return None, None
     try:
         # Videos use a <source> tag; images use <img>.
-        if 'type="video/mp4' in str(file_element):
-            file_tag = file_element.find("source")
-            file_url = file_tag.get("src") if file_tag else None
+        if 'type="video/mp4' in file_element.html:
+            file_tag = file_element.css_first("source")
+            file_url = file_tag.attributes.get("src") if file_tag else None
             file_type = "video"
         else:
-            img_tag = file_element.find("img")
+            img_tag = file_element.css_first("img")
             file_type = "image"
             file_url = None
             if img_tag:
                 # Prefer the highest‑resolution image from srcset if available.
-                srcset = img_tag.get("srcset") or img_tag.get("data-srcset")
+                srcset = img_tag.attributes.get("srcset") or img_tag.attributes.get("data-srcset")
                 if srcset:
                     # srcset is a comma‑separated list of "URL width" entries.  Choose the URL
-                    # from the last entry assuming it represents the largest width.
-                    try:
-                        candidates = [s.strip().split()[0] for s in srcset.split(',') if s.strip()]
-                        if candidates:
-                            file_url = candidates[-1]
-                    except Exception:
-                        file_url = None
+                    # from the last entry assuming it represents the largest width; only
+                    # that entry is split off rather than the whole list.
+                    last = srcset.rstrip().rstrip(',').rsplit(',', 1)[-1].strip()
+                    file_url = last.split(None, 1)[0] if last else None
                 # Fallback to src attribute
                 if not file_url:
-                    file_url = img_tag.get("src")
+                    file_url = img_tag.attributes.get("src")
         return (file_url, file_type) if file_url else (None, None)
     except Exception:
         return None, None
@@ -137,15 +231,251 @@ def prepare_filename(file_url: str, index: int, file_type: str) -> str:
     return f"{base_part}_{index}{extension}"
 
 
-def download_single(base_url: str, target_dir: str, index: int, model_name: str) -> None:
-    """Download a single media file.
+def _is_stored(arcname: str) -> bool:
+    """Return ``True`` if ``arcname`` should be stored without compression."""
+    return os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS
+
+
+class ArchiveWriter:
+    """ZIP archive that can be fed from several threads.
+
+    Downloads are written straight into the archive instead of being saved
+    to disk first.  The archive is built in ``<zip_path>.part`` and only
+    moved over ``zip_path`` once it has been closed cleanly, so an
+    interrupted run never damages an existing archive.  Entries of an
+    existing archive are copied into the new one first so that files fetched
+    by an earlier run are kept and not downloaded again; a missing or
+    corrupt archive is started from scratch.
+
+    Already-compressed media (see :data:`STORED_EXTENSIONS`) is stored
+    without compression; any other file is DEFLATE-compressed by
+    :mod:`zipfile` at :data:`ZIP_COMPRESSLEVEL`.
+    """
+
+    def __init__(self, zip_path: str) -> None:
+        self._zip_path = zip_path
+        self._part_path = zip_path + PART_SUFFIX
+        self._lock = threading.Lock()
+        self._names = set()
+        self._zf = self._open_part()
+        try:
+            if zipfile.is_zipfile(zip_path):
+                self._copy_previous()
+        except BaseException:
+            self._zf.close()
+            raise
+
+    def _open_part(self) -> zipfile.ZipFile:
+        """Create (or truncate) the ``.part`` file and open it for writing."""
+        return zipfile.ZipFile(
+            self._part_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESSLEVEL
+        )
+
+    def _copy_previous(self) -> None:
+        """Copy every entry of the existing archive into the ``.part`` file.
+
+        :func:`zipfile.is_zipfile` only checks the end record, so a damaged
+        entry may still turn up while copying.  The archive is then treated
+        as corrupt and the ``.part`` file is started afresh.
+        """
+        try:
+            with zipfile.ZipFile(self._zip_path) as previous:
+                for info in previous.infolist():
+                    self._copy_entry(previous, info)
+        except (zipfile.BadZipFile, zlib.error, EOFError, OSError):
+            self._zf.close()
+            self._names.clear()
+            self._zf = self._open_part()
+
+    def _copy_entry(self, source: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        """Copy the entry ``info`` of ``source`` into this archive.
+
+        The entry is recompressed with the settings :meth:`add_stream` would
+        use, so media written by older versions ends up stored as well.
+        """
+        copy = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        if _is_stored(info.filename):
+            copy.compress_type = zipfile.ZIP_STORED
+        else:
+            copy.compress_type = zipfile.ZIP_DEFLATED
+            # zipfile has no public way to set the level of a ZipInfo entry
+            copy._compresslevel = ZIP_COMPRESSLEVEL
+        copy.external_attr = info.external_attr
+        copy.file_size = info.file_size
+        with source.open(info) as src, self._zf.open(copy, 'w') as dst:
+            shutil.copyfileobj(src, dst, ARCHIVE_COPY_BUFSIZE)
+        self._names.add(info.filename)
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __contains__(self, arcname: str) -> bool:
+        return arcname in self._names
+
+    def close(self) -> None:
+        """Write the central directory and move the archive into place."""
+        with self._lock:
+            self._zf.close()
+            os.replace(self._part_path, self._zip_path)
+
+    def add_stream(self, arcname: str, fileobj: BinaryIO) -> None:
+        """Add the remaining contents of ``fileobj`` as ``arcname``.
+
+        Entries that are already present in the archive are skipped.
+        """
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(0)
+        if _is_stored(arcname):
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+            info.external_attr = 0o644 << 16
+            info.file_size = size
+            target, force_zip64 = info, False
+        else:
+            # A plain name picks up the archive's compression settings
+            target, force_zip64 = arcname, size * 1.05 > zipfile.ZIP64_LIMIT
+        with self._lock:
+            if arcname in self._names:
+                return
+            with self._zf.open(target, 'w', force_zip64=force_zip64) as dst:
+                shutil.copyfileobj(fileobj, dst, ARCHIVE_COPY_BUFSIZE)
+            self._names.add(arcname)
+
+    def add_directory(self, source_dir: str) -> None:
+        """Add every file in ``source_dir`` that is not archived yet.
+
+        Used to fold in media saved to disk by earlier versions of the
+        application.
+
+        Args:
+            source_dir: Directory holding previously downloaded media files.
+        """
+        # Downloads were always saved flat, so a single scandir pass suffices
+        with os.scandir(source_dir) as it:
+            entries = [
+                (entry.path, entry.name)
+                for entry in it
+                if entry.name not in self._names and entry.is_file(follow_symlinks=False)
+            ]
+        for abs_path, arcname in entries:
+            compress_type = zipfile.ZIP_STORED if _is_stored(arcname) else None
+            with self._lock:
+                self._zf.write(abs_path, arcname=arcname, compress_type=compress_type)
+                self._names.add(arcname)
+
+
+# Basename of a CDN media URL, e.g. ``model_0001.jpg``.
+_CDN_BASENAME_RE = re.compile(r"^(?P<stem>.*?)(?P<num>\d+)(?P<ext>\.\w+)$")
+
+
+def _media_bucket(index: int) -> int:
+    """Return the CDN directory that holds ``index`` (1–1000 → 1000, ...)."""
+    return ((index - 1) // 1000 + 1) * 1000
+
+
+def _escape_format(text: str) -> str:
+    """Escape literal braces in ``text`` for use in a format string."""
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def learn_url_template(file_url: str, index: int) -> Optional[str]:
+    """Derive a direct CDN URL template from a known media URL.
+
+    Fapello serves media from predictable paths such as
+    ``/content/<a>/<b>/<model>/1000/<model>_0001.jpg``.  Given the resolved
+    URL for ``index`` this returns a :meth:`str.format` template with
+    ``index`` and ``bucket`` fields that reproduces it, or ``None`` when the
+    URL does not follow that layout.
+    """
+    head, _, basename = file_url.rpartition('/')
+    match = _CDN_BASENAME_RE.match(basename)
+    if not head or not match or int(match.group('num')) != index:
+        return None
+    num = match.group('num')
+    field = f"{{index:0{len(num)}d}}" if num.startswith('0') else "{index}"
+    basename_template = _escape_format(match.group('stem')) + field + _escape_format(match.group('ext'))
+    parent, _, folder = head.rpartition('/')
+    if folder.isdigit() and int(folder) == _media_bucket(index):
+        return f"{_escape_format(parent)}/{{bucket}}/{basename_template}"
+    return f"{_escape_format(head)}/{basename_template}"
+
+
+def _guess_url(url_template: str, index: int) -> str:
+    """Return the direct CDN URL for ``index`` predicted by ``url_template``."""
+    return url_template.format(index=index, bucket=_media_bucket(index))
+
+
+def _exceeds_spool(content_length: Optional[str]) -> bool:
+    """Return ``True`` if the advertised length exceeds :data:`SPOOL_MAX_SIZE`."""
+    return bool(content_length and content_length.isdigit() and int(content_length) > SPOOL_MAX_SIZE)
+
+
+def _spool(content_length: Optional[str]) -> tempfile.SpooledTemporaryFile:
+    """Return a buffer for a response body of the advertised length.
+
+    Bodies are kept in memory, spilling large videos to a temporary file.
+    When the length is known to exceed :data:`SPOOL_MAX_SIZE` the buffer
+    starts out on disk instead of filling memory first.
+    """
+    buf = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    if _exceeds_spool(content_length):
+        buf.rollover()
+    return buf
+
+
+def _store_response(r: requests.Response, filename: str, archive: ArchiveWriter) -> None:
+    """Copy the body of the streamed response ``r`` into ``archive``."""
+    with _spool(r.headers.get('Content-Length')) as buf:
+        # Copy in C with large reads rather than looping over small chunks
+        r.raw.decode_content = True
+        shutil.copyfileobj(r.raw, buf, ARCHIVE_COPY_BUFSIZE)
+        archive.add_stream(filename, buf)
+
+
+def _download_guessed(archive: ArchiveWriter, index: int, url_template: str) -> bool:
+    """Try to fetch media ``index`` straight from its predicted CDN URL.
+
+    Returns ``True`` if the file was archived (or already present) and
+    ``False`` if the caller should fall back to scraping the media page.
+    """
+    file_url = _guess_url(url_template, index)
+    # Templates are learnt from images, so the guess names an image file
+    if prepare_filename(file_url, index, "image") in archive:
+        return True
+    try:
+        with SESSION.get(file_url, timeout=60, stream=True) as r:
+            content_type = r.headers.get('Content-Type', '')
+            if not r.ok or not content_type.startswith(('image/', 'video/')):
+                return False
+            file_type = "video" if content_type.startswith('video/') else "image"
+            _store_response(r, prepare_filename(file_url, index, file_type), archive)
+        return True
+    except Exception:
+        return False
+
+
+def download_single(
+    base_url: str,
+    archive: ArchiveWriter,
+    index: int,
+    model_name: str,
+    url_template: Optional[str] = None,
+) -> None:
+    """Download a single media file into the archive.
 
     Args:
         base_url: The base URL of the Fapello page (ending with a slash).
-        target_dir: The path where downloaded files will be stored.
+        archive: The archive the downloaded file is written to.
         index: The media index (appended to ``base_url``).
         model_name: The username derived from the URL; used to filter files.
+        url_template: Optional CDN URL template from :func:`learn_url_template`.
+            When given the media file is requested directly first, and the
+            media page is only scraped if that fails.
     """
+    if url_template and _download_guessed(archive, index, url_template):
+        return
     # Compose the full URL to the individual media page (e.g. .../0/, .../1/)
     link = f"{base_url}{index}"
     file_url, file_type = get_fapello_file_url(link)
@@ -157,71 +487,294 @@ def download_single(base_url: str, target_dir: str, index: int, model_name: str)
     if model_name and model_name not in file_url:
         return
     filename = prepare_filename(file_url, index, file_type)
-    dest_path = os.path.join(target_dir, filename)
-    # Skip download if the file already exists
-    if os.path.exists(dest_path):
+    # Skip download if the file is already archived
+    if filename in archive:
         return
     try:
-        with requests.get(file_url, headers=HEADERS_FOR_REQUESTS, timeout=60, stream=True) as r:
+        with SESSION.get(file_url, timeout=60, stream=True) as r:
             r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            _store_response(r, filename, archive)
     except Exception:
         # Ignore download errors for individual files
         return
 
 
+def _template_from_sample(
+    file_url: Optional[str], file_type: Optional[str], index: int, model_name: str
+) -> Optional[str]:
+    """Return a CDN URL template learnt from a scraped sample, if usable."""
+    if file_type != "image" or not file_url or (model_name and model_name not in file_url):
+        return None
+    return learn_url_template(file_url, index)
+
+
+def _model_name_from_url(url: str) -> str:
+    """Derive the model name from a page URL (e.g. https://fapello.com/model-name/)."""
+    parts = [p for p in url.split('/') if p]
+    return parts[-1] if parts and parts[-1] else (parts[-2] if len(parts) >= 2 else '')
+
+
+def _progress_reporter(
+    progress_cb: Optional[Callable[[str, int, int], None]], model_name: str, total_count: int
+) -> Callable[[], None]:
+    """Return a function to call once after each media file is processed.
+
+    Completed files are counted with :func:`itertools.count`, whose ``next``
+    is atomic under the GIL, so workers never contend on a lock just to
+    count.  Free-threaded builds give no such guarantee, so there the count
+    is taken under a lock.  ``progress_cb`` is only invoked for every 0.5% of
+    ``total_count``, after a quiet period of :data:`PROGRESS_MIN_INTERVAL`
+    seconds, and for the final file.  Reports never go backwards.
+    """
+    counter = itertools.count(1)
+    step = max(1, total_count // 200)
+    # Last emitted (time, count); a list so the closure can update it
+    last_emit = [0.0, 0]
+    emit_lock = threading.Lock()
+    count_lock = threading.Lock() if FREE_THREADED else None
+
+    def report() -> None:
+        if count_lock is not None:
+            with count_lock:
+                current = next(counter)
+        else:
+            current = next(counter)
+        if not progress_cb:
+            return
+        now = time.monotonic()
+        if current != total_count and current % step and now - last_emit[0] <= PROGRESS_MIN_INTERVAL:
+            return
+        with emit_lock:
+            if current <= last_emit[1]:
+                return
+            last_emit[:] = [now, current]
+            try:
+                progress_cb(model_name, current, total_count)
+            except Exception:
+                # Ignore errors in the callback
+                pass
+
+    return report
+
+
+def download_all_sync(
+    url: str,
+    zip_path: str,
+    max_workers: int = 4,
+    progress_cb: Optional[Callable[[str, int, int], None]] = None,
+    legacy_dir: Optional[str] = None,
+) -> int:
+    """Thread-based implementation of :func:`download_all`.
+
+    Used when :mod:`aiohttp` is not installed.  Each worker thread blocks on
+    its own request through the shared :data:`SESSION`.
+    """
+    total_count = get_fapello_files_number(url)
+    model_name = _model_name_from_url(url)
+    # Learn the CDN URL layout from the first media page
+    url_template = None
+    if total_count > TEMPLATE_SAMPLE_INDEX:
+        sample = get_fapello_file_url(f"{url}{TEMPLATE_SAMPLE_INDEX}")
+        url_template = _template_from_sample(*sample, TEMPLATE_SAMPLE_INDEX, model_name)
+    report_progress = _progress_reporter(progress_cb, model_name, total_count)
+
+    with ArchiveWriter(zip_path) as archive:
+        if legacy_dir and os.path.isdir(legacy_dir):
+            archive.add_directory(legacy_dir)
+
+        def download_wrapper(idx: int) -> None:
+            # Download the individual file
+            download_single(url, archive, idx, model_name, url_template)
+            report_progress()
+
+        # Use threads rather than processes for better HTTP connection sharing
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(download_wrapper, range(total_count)))
+    return total_count
+
+
+@contextlib.asynccontextmanager
+async def _get(
+    session: "aiohttp.ClientSession", url: str, timeout: "aiohttp.ClientTimeout"
+) -> AsyncIterator["aiohttp.ClientResponse"]:
+    """GET ``url``, retrying with the same policy as :data:`SESSION`.
+
+    The final response is yielded whatever its status; callers check it.
+    """
+    for attempt in range(RETRY_TOTAL + 1):
+        if attempt > 1:
+            # Same schedule as urllib3: the first retry is immediate
+            await asyncio.sleep(RETRY_BACKOFF_FACTOR * 2 ** (attempt - 1))
+        try:
+            r = await session.get(url, timeout=timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == RETRY_TOTAL:
+                raise
+            continue
+        if r.status in RETRY_STATUSES and attempt < RETRY_TOTAL:
+            r.release()
+            continue
+        break
+    try:
+        yield r
+    finally:
+        r.release()
+
+
+async def _fetch(session: "aiohttp.ClientSession", url: str) -> Optional[bytes]:
+    """Return the body of ``url`` or ``None`` if the request fails."""
+    try:
+        async with _get(session, url, PAGE_TIMEOUT) as r:
+            return await r.read()
+    except Exception:
+        return None
+
+
+async def _store_response_async(
+    r: "aiohttp.ClientResponse", filename: str, archive: ArchiveWriter
+) -> None:
+    """Asynchronous counterpart of :func:`_store_response`."""
+    content_length = r.headers.get('Content-Length')
+    on_disk = _exceeds_spool(content_length)
+    with _spool(content_length) as buf:
+        size = 0
+        async for chunk in r.content.iter_chunked(ARCHIVE_COPY_BUFSIZE):
+            size += len(chunk)
+            on_disk = on_disk or size > SPOOL_MAX_SIZE
+            if on_disk:
+                # The buffer has spilled (or is about to spill) to disk; do
+                # not block the event loop on file writes.
+                await asyncio.to_thread(buf.write, chunk)
+            else:
+                buf.write(chunk)
+        # Archive writes take a lock and may hit the disk; keep them off the
+        # event loop.
+        await asyncio.to_thread(archive.add_stream, filename, buf)
+
+
+async def _download_guessed_async(
+    session: "aiohttp.ClientSession", archive: ArchiveWriter, index: int, url_template: str
+) -> bool:
+    """Asynchronous counterpart of :func:`_download_guessed`."""
+    file_url = _guess_url(url_template, index)
+    if prepare_filename(file_url, index, "image") in archive:
+        return True
+    try:
+        async with _get(session, file_url, MEDIA_TIMEOUT) as r:
+            content_type = r.headers.get('Content-Type', '')
+            if not r.ok or not content_type.startswith(('image/', 'video/')):
+                return False
+            file_type = "video" if content_type.startswith('video/') else "image"
+            await _store_response_async(r, prepare_filename(file_url, index, file_type), archive)
+        return True
+    except Exception:
+        return False
+
+
+async def _process(
+    session: "aiohttp.ClientSession",
+    sem: asyncio.Semaphore,
+    archive: ArchiveWriter,
+    base_url: str,
+    index: int,
+    model_name: str,
+    url_template: Optional[str],
+) -> None:
+    """Asynchronous counterpart of :func:`download_single`."""
+    async with sem:
+        if url_template and await _download_guessed_async(session, archive, index, url_template):
+            return
+        content = await _fetch(session, f"{base_url}{index}")
+        if content is None:
+            return
+        file_url, file_type = _parse_file_url(content)
+        if not file_url or not file_type:
+            return
+        if model_name and model_name not in file_url:
+            return
+        filename = prepare_filename(file_url, index, file_type)
+        if filename in archive:
+            return
+        try:
+            async with _get(session, file_url, MEDIA_TIMEOUT) as r:
+                r.raise_for_status()
+                await _store_response_async(r, filename, archive)
+        except Exception:
+            # Ignore download errors for individual files
+            return
+
+
+async def _download_all_async(
+    url: str,
+    zip_path: str,
+    max_workers: int,
+    progress_cb: Optional[Callable[[str, int, int], None]],
+    legacy_dir: Optional[str],
+) -> int:
+    """:mod:`asyncio` implementation of :func:`download_all`."""
+    model_name = _model_name_from_url(url)
+    connector = aiohttp.TCPConnector(limit=max_workers, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS_FOR_REQUESTS) as session:
+        content = await _fetch(session, url)
+        total_count = _parse_files_number(content, url) if content is not None else 0
+        # Learn the CDN URL layout from the first media page
+        url_template = None
+        if total_count > TEMPLATE_SAMPLE_INDEX:
+            content = await _fetch(session, f"{url}{TEMPLATE_SAMPLE_INDEX}")
+            if content is not None:
+                sample = _parse_file_url(content)
+                url_template = _template_from_sample(*sample, TEMPLATE_SAMPLE_INDEX, model_name)
+        report_progress = _progress_reporter(progress_cb, model_name, total_count)
+
+        async def download_wrapper(idx: int) -> None:
+            await _process(session, sem, archive, url, idx, model_name, url_template)
+            report_progress()
+
+        sem = asyncio.Semaphore(max_workers)
+        archive = await asyncio.to_thread(ArchiveWriter, zip_path)
+        try:
+            if legacy_dir and os.path.isdir(legacy_dir):
+                await asyncio.to_thread(archive.add_directory, legacy_dir)
+            await asyncio.gather(*(download_wrapper(idx) for idx in range(total_count)))
+        finally:
+            await asyncio.to_thread(archive.close)
+    return total_count
+
+
 def download_all(
     url: str,
-    target_dir: str,
+    zip_path: str,
     max_workers: int = 4,
     progress_cb: Optional[Callable[[str, int, int], None]] = None,
+    legacy_dir: Optional[str] = None,
 ) -> int:
-    """Download all media files from a Fapello page.
+    """Download all media files from a Fapello page into a ZIP archive.
 
     This function orchestrates concurrent downloads and optionally reports
-    progress via the supplied callback.
+    progress via the supplied callback.  Files are streamed directly into
+    the archive; nothing is written to a per-model directory.  Requests are
+    issued from a single :mod:`asyncio` event loop when :mod:`aiohttp` is
+    installed, otherwise from a thread pool (see :func:`download_all_sync`).
 
     Args:
         url: Fapello page URL (must end with a slash).
-        target_dir: Directory where media files should be stored.
-        max_workers: Number of threads to use for downloading.
+        zip_path: Path of the ZIP archive receiving the media files.  An
+            existing archive is extended rather than replaced.
+        max_workers: Maximum number of downloads in flight at once.
         progress_cb: Optional callable that will be invoked after each file
             is downloaded.  It must accept three positional arguments:
             ``(model_name, current_count, total_count)``.
+        legacy_dir: Optional directory of media saved by earlier versions of
+            the application.  Its files are added to the archive first and
+            are not downloaded again.
 
     Returns:
         The total number of files scheduled for download.  A value of zero
         indicates that either no media files were found or the page could
         not be parsed.
     """
-    os.makedirs(target_dir, exist_ok=True)
-    total_count = get_fapello_files_number(url)
-    # Derive the model name from the URL (e.g. https://fapello.com/model-name/)
-    parts = [p for p in url.split('/') if p]
-    model_name = parts[-1] if parts and parts[-1] else (parts[-2] if len(parts) >= 2 else '')
-    # Thread-safe counter for completed downloads
-    current_count = 0
-    counter_lock = threading.Lock()
-
-    def download_wrapper(idx: int) -> None:
-        nonlocal current_count
-        # Download the individual file
-        download_single(url, target_dir, idx, model_name)
-        if progress_cb:
-            # Safely increment the counter and report progress
-            with counter_lock:
-                current_count += 1
-                current = current_count
-            try:
-                progress_cb(model_name, current, total_count)
-            except Exception:
-                # Ignore errors in the callback
-                pass
-
-    # Use threads rather than processes for better HTTP connection sharing
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        list(executor.map(download_wrapper, range(total_count)))
-    return total_count
\ No newline at end of file
+    if aiohttp is None:
+        return download_all_sync(url, zip_path, max_workers, progress_cb, legacy_dir)
+    return asyncio.run(
+        _download_all_async(url, zip_path, max_workers, progress_cb, legacy_dir)
+    )